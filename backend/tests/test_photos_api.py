@@ -69,6 +69,36 @@ def test_create_share_and_download_archive(client, admin_headers, tmp_path):
     assert zip_response.headers["Content-Type"] == "application/zip"
 
 
+def test_share_reflects_photo_deletion(client, admin_headers):
+    first_id, _ = _upload_sample(client)
+    second_id, _ = _upload_sample(client)
+
+    response = client.post(
+        "/shares",
+        json={"photo_ids": [first_id, second_id]},
+        headers=admin_headers,
+    )
+    token = response.get_json()["token"]
+
+    # Prime the cached payload, then delete a member photo.
+    assert len(client.get(f"/shares/{token}").get_json()["photos"]) == 2
+    client.delete("/photos", json={"photo_ids": [first_id]}, headers=admin_headers)
+
+    remaining = client.get(f"/shares/{token}").get_json()["photos"]
+    assert [photo["id"] for photo in remaining] == [second_id]
+
+
+def test_rejected_upload_leaves_no_spooled_files(client):
+    data = {
+        "unexpected_field": (io.BytesIO(b"alien-bytes"), "alien.jpg"),
+    }
+    response = client.post("/images/add", data=data, content_type="multipart/form-data")
+    assert response.status_code == 400
+
+    upload_dir = client.application.config["UPLOAD_FOLDER"]
+    assert not os.listdir(upload_dir), "Rejected uploads must not leave files behind"
+
+
 def test_delete_photos_removes_files(client, admin_headers):
     photo_id, _ = _upload_sample(client)
 